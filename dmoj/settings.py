@@ -88,6 +88,9 @@ DMOJ_USER_DATA_DOWNLOAD = False
 DMOJ_USER_DATA_CACHE = ''
 DMOJ_USER_DATA_DOWNLOAD_RATELIMIT = datetime.timedelta(days=1)
 
+# Seconds to cache a contest's live ranking; it is also cleared whenever a participation changes
+DMOJ_CONTEST_RANKING_CACHE_TTL = 60
+
 DMOJ_COMMENT_VOTE_HIDE_THRESHOLD = -5
 DMOJ_COMMENT_REPLY_TIMEFRAME = datetime.timedelta(days=365)
 
@@ -506,6 +509,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Keep connections open between requests. The bridge relies on this to avoid reconnecting on every packet.
+        'CONN_MAX_AGE': 60,
     },
 }
 
@@ -516,6 +521,10 @@ BRIDGED_JUDGE_ADDRESS = [('localhost', 9999)]
 BRIDGED_JUDGE_PROXIES = None
 BRIDGED_DJANGO_ADDRESS = [('localhost', 9998)]
 BRIDGED_DJANGO_CONNECT = None
+# Recalculate user points, problem statistics and contest scores in Celery instead of the bridge.
+# This requires a running Celery worker, and a cache shared by the bridge and the workers (e.g. memcached or redis),
+# which tracks the pending recalculations. With the default local memory cache, the bridge does not defer.
+BRIDGED_DEFER_STATS = False
 
 # Event Server configuration
 EVENT_DAEMON_USE = False
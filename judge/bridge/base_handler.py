@@ -51,6 +51,7 @@ class RequestHandlerMeta(type):
 
 class ZlibPacketHandler(metaclass=RequestHandlerMeta):
     proxies = []
+    compression_level = zlib.Z_DEFAULT_COMPRESSION
 
     def __init__(self, request, client_address, server):
         self.request = request
@@ -194,7 +195,7 @@ class ZlibPacketHandler(metaclass=RequestHandlerMeta):
             self.on_cleanup()
 
     def send(self, data):
-        compressed = zlib.compress(data.encode('utf-8'))
+        compressed = zlib.compress(data.encode('utf-8'), self.compression_level)
         self.request.sendall(size_pack.pack(len(compressed)) + compressed)
 
     def close(self):
@@ -6,7 +6,7 @@ from functools import partial
 from django.conf import settings
 
 from judge.bridge.django_handler import DjangoHandler
-from judge.bridge.judge_handler import JudgeHandler
+from judge.bridge.judge_handler import JudgeHandler, can_defer_stats
 from judge.bridge.judge_list import JudgeList
 from judge.bridge.server import Server
 from judge.models import Judge, Submission
@@ -24,6 +24,10 @@ def judge_daemon():
         .update(status='IE', result='IE', error=None)
     judges = JudgeList()
 
+    if settings.BRIDGED_DEFER_STATS and not can_defer_stats():
+        logger.warning('BRIDGED_DEFER_STATS needs a cache shared with the Celery workers, '
+                       'recalculating statistics in the bridge instead')
+
     judge_server = Server(settings.BRIDGED_JUDGE_ADDRESS, partial(JudgeHandler, judges=judges))
     django_server = Server(settings.BRIDGED_DJANGO_ADDRESS, partial(DjangoHandler, judges=judges))
 
@@ -4,13 +4,16 @@ import struct
 
 from django import db
 
-from judge.bridge.base_handler import Disconnect, ZlibPacketHandler
+from judge.bridge.base_handler import ZlibPacketHandler
 
 logger = logging.getLogger('judge.bridge')
 size_pack = struct.Struct('!I')
 
 
 class DjangoHandler(ZlibPacketHandler):
+    # Replies are tiny control packets, where the fastest level compresses just as well.
+    compression_level = 1
+
     def __init__(self, request, client_address, server, judges):
         super().__init__(request, client_address, server)
 
@@ -22,6 +25,10 @@ class DjangoHandler(ZlibPacketHandler):
         }
         self.judges = judges
 
+    def on_connect(self):
+        # The site keeps its connection open between requests; drop it if it has been idle for too long.
+        self.timeout = 600
+
     def send(self, data):
         super().send(json.dumps(data, separators=(',', ':')))
 
@@ -32,8 +39,11 @@ class DjangoHandler(ZlibPacketHandler):
         except Exception:
             logger.exception('Error in packet handling (Django-facing)')
             result = {'name': 'bad-request'}
+        finally:
+            # Each site worker thread keeps a connection, and so a handler thread, open while idle. Do not also
+            # hold a database connection for every one of them in between requests.
+            db.connection.close()
         self.send(result)
-        raise Disconnect()
 
     def on_submission(self, data):
         id = data['submission-id']
@@ -1,6 +1,7 @@
 import hmac
 import json
 import logging
+import queue
 import threading
 import time
 from collections import deque, namedtuple
@@ -8,18 +9,35 @@ from operator import itemgetter
 
 from django import db
 from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Max, Min, OuterRef, Subquery, Sum
 from django.utils import timezone
 
 from judge import event_poster as event
 from judge.bridge.base_handler import ZlibPacketHandler, proxy_list
 from judge.caching import finished_submission
 from judge.models import Judge, Language, LanguageLimit, Problem, RuntimeVersion, Submission, SubmissionTestCase
+from judge.tasks.contest import recompute_participation
+from judge.tasks.submission import update_problem_stats
+from judge.tasks.user import recalculate_user_points
+from judge.utils.celery import delay_once
 
 logger = logging.getLogger('judge.bridge')
 json_log = logging.getLogger('judge.json.bridge')
 
 UPDATE_RATE_LIMIT = 5
 UPDATE_RATE_TIME = 0.5
+TEST_CASE_BUFFER_SIZE = 50
+BACKGROUND_QUEUE_SIZE = 1000
+# Test case status flags sent by the judge, in order of precedence.
+TEST_CASE_STATUS_FLAGS = ((4, 'TLE'), (8, 'MLE'), (64, 'OLE'), (2, 'RTE'), (16, 'IR'), (1, 'WA'), (32, 'SC'))
+TEST_CASE_STATUS = tuple(next((code for flag, code in TEST_CASE_STATUS_FLAGS if flags & flag), 'AC')
+                         for flags in range(128))
+# Submission results, from least to most severe.
+STATUS_CODES = ('SC', 'AC', 'WA', 'MLE', 'TLE', 'IR', 'RTE', 'OLE')
+STATUS_PRIORITY = {code: i for i, code in enumerate(STATUS_CODES)}
 SubmissionData = namedtuple('SubmissionData', 'time memory short_circuit pretests_only contest_no attempt_no user_id')
 
 
@@ -27,6 +45,49 @@ def _ensure_connection():
     db.connection.close_if_unusable_or_obsolete()
 
 
+def can_defer_stats():
+    # delay_once() marks a task as pending in the cache until the Celery worker running it clears the mark.
+    # With a cache local to each process, the mark is never cleared and later recalculations are dropped.
+    return settings.BRIDGED_DEFER_STATS and not isinstance(caches['default'], LocMemCache)
+
+
+# Cache invalidation and event posting happen on a separate thread, so that a slow cache or event server
+# does not hold up packet handling. A single thread keeps everything in the order it was queued.
+_background_queue = queue.Queue(BACKGROUND_QUEUE_SIZE)
+_background_lock = threading.Lock()
+_background_thread = None
+
+
+def _background_worker():
+    while True:
+        func, args = _background_queue.get()
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('Error in background bridge task')
+
+
+def _run_in_background(func, *args):
+    global _background_thread
+    if _background_thread is None:
+        with _background_lock:
+            if _background_thread is None:
+                _background_thread = threading.Thread(target=_background_worker, daemon=True)
+                _background_thread.start()
+
+    while True:
+        try:
+            _background_queue.put_nowait((func, args))
+            return
+        except queue.Full:
+            # Drop the oldest task, rather than letting a stuck worker hold up the bridge or use unbounded memory.
+            try:
+                _background_queue.get_nowait()
+            except queue.Empty:
+                pass
+            logger.warning('Background bridge queue is full, dropped a task')
+
+
 class JudgeHandler(ZlibPacketHandler):
     proxies = proxy_list(settings.BRIDGED_JUDGE_PROXIES or [])
 
@@ -65,13 +126,21 @@ class JudgeHandler(ZlibPacketHandler):
         self._ping_average = deque(maxlen=6)  # 1 minute average, just like load
         self._time_delta = deque(maxlen=6)
 
-        # each value is (updates, last reset)
+        # each value is (tokens, last update)
         self.update_counter = {}
+        # test cases received but not yet written to the database
+        self._test_case_buffer = []
+        # running totals of the test cases of the submission being graded, keyed by batch
+        self._case_groups_id = None
+        self._case_groups = {}
+        self._case_statuses = set()
         self.judge = None
         self.judge_address = None
 
         self._submission_cache_id = None
-        self._submission_cache = {}
+        self._submission_cache = None
+        self._id_secret_cache_id = None
+        self._id_secret_cache = None
 
     def on_connect(self):
         self.timeout = 15
@@ -114,37 +183,56 @@ class JudgeHandler(ZlibPacketHandler):
         judge.start_time = timezone.now()
         judge.online = True
         judge.problems.set(Problem.objects.filter(code__in=list(self.problems.keys())))
-        judge.runtimes.set(Language.objects.filter(key__in=list(self.executors.keys())))
+        languages = list(Language.objects.filter(key__in=list(self.executors.keys())))
+        judge.runtimes.set(languages)
 
         # Cache is_disabled for faster access
         self.is_disabled = judge.is_disabled
 
-        # Delete now in case we somehow crashed and left some over from the last connection
-        RuntimeVersion.objects.filter(judge=judge).delete()
-        versions = []
-        for lang in judge.runtimes.all():
-            versions += [
-                RuntimeVersion(language=lang, name=name, version='.'.join(map(str, version)), priority=idx, judge=judge)
-                for idx, (name, version) in enumerate(self.executors[lang.key])
-            ]
-        RuntimeVersion.objects.bulk_create(versions)
+        # Runtimes are kept across connections, so only write the ones that changed since last time.
+        existing = {}
+        stale = []
+        for runtime in RuntimeVersion.objects.filter(judge=judge):
+            key = (runtime.language_id, runtime.name)
+            if key in existing:
+                stale.append(runtime.id)
+            else:
+                existing[key] = runtime
+
+        created = []
+        updated = []
+        for lang in languages:
+            for idx, (name, version) in enumerate(self.executors[lang.key]):
+                version = '.'.join(map(str, version))
+                runtime = existing.pop((lang.id, name), None)
+                if runtime is None:
+                    created.append(RuntimeVersion(language=lang, name=name, version=version, priority=idx, judge=judge))
+                elif runtime.version != version or runtime.priority != idx:
+                    runtime.version = version
+                    runtime.priority = idx
+                    updated.append(runtime)
+        stale += [runtime.id for runtime in existing.values()]
+
+        if stale:
+            RuntimeVersion.objects.filter(id__in=stale).delete()
+        if updated:
+            RuntimeVersion.objects.bulk_update(updated, ['version', 'priority'], batch_size=500)
+        RuntimeVersion.objects.bulk_create(created, batch_size=500)
         judge.last_ip = self.client_address[0]
-        judge.save()
+        judge.save(update_fields=['start_time', 'online', 'last_ip'])
         self.judge_address = '[%s]:%s' % (self.client_address[0], self.client_address[1])
         json_log.info(self._make_json_log(action='auth', info='judge successfully authenticated',
                                           executors=list(self.executors.keys())))
 
     def _disconnected(self):
         Judge.objects.filter(id=self.judge.id).update(online=False)
-        RuntimeVersion.objects.filter(judge=self.judge).delete()
 
     def _update_ping(self):
         try:
-            Judge.objects.filter(name=self.name).update(ping=self.latency, load=self.load)
-        except Exception as e:
-            # What can I do? I don't want to tie this to MySQL.
-            if e.__class__.__name__ == 'OperationalError' and e.__module__ == '_mysql_exceptions' and e.args[0] == 2006:
-                db.connection.close()
+            Judge.objects.filter(id=self.judge.id).update(ping=self.latency, load=self.load)
+        except db.OperationalError:
+            # The connection has likely gone away; the next ping will reconnect.
+            db.connection.close()
 
     def send(self, data):
         super().send(json.dumps(data, separators=(',', ':')))
@@ -183,27 +271,40 @@ class JudgeHandler(ZlibPacketHandler):
         _ensure_connection()
 
         try:
-            pid, time, memory, short_circuit, lid, is_pretested, sub_date, uid, part_virtual, part_id = (
-                Submission.objects.filter(id=submission)
-                          .values_list('problem__id', 'problem__time_limit', 'problem__memory_limit',
-                                       'problem__short_circuit', 'language__id', 'is_pretested', 'date', 'user__id',
-                                       'contest__participation__virtual', 'contest__participation__id')).get()
-        except Submission.DoesNotExist:
+            return self._get_related_submission_data(submission)
+        except db.OperationalError:
+            # The persistent connection may have been dropped by the server, so reconnect and try once more.
+            db.connection.close()
+            return self._get_related_submission_data(submission)
+
+    def _get_related_submission_data(self, submission):
+        # Fetch any language-specific limits in the same query, instead of looking them up separately.
+        language_limit = LanguageLimit.objects.filter(problem_id=OuterRef('problem_id'),
+                                                      language_id=OuterRef('language_id'))
+        data = (
+            Submission.objects.filter(id=submission)
+                      .annotate(limit_time=Subquery(language_limit.values('time_limit')[:1]),
+                                limit_memory=Subquery(language_limit.values('memory_limit')[:1]))
+                      .values_list('problem__id', 'problem__time_limit', 'problem__memory_limit',
+                                   'problem__short_circuit', 'limit_time', 'limit_memory', 'is_pretested',
+                                   'date', 'user__id', 'contest__participation__virtual',
+                                   'contest__participation__id').first()
+        )
+        if data is None:
             logger.error('Submission vanished: %s', submission)
             json_log.error(self._make_json_log(
                 sub=self._working, action='request',
                 info='submission vanished when fetching info',
             ))
             return
+        (pid, time, memory, short_circuit, limit_time, limit_memory, is_pretested, sub_date, uid, part_virtual,
+         part_id) = data
 
         attempt_no = Submission.objects.filter(problem__id=pid, contest__participation__id=part_id, user__id=uid,
                                                date__lt=sub_date).exclude(status__in=('CE', 'IE')).count() + 1
 
-        try:
-            time, memory = (LanguageLimit.objects.filter(problem__id=pid, language__id=lid)
-                            .values_list('time_limit', 'memory_limit').get())
-        except LanguageLimit.DoesNotExist:
-            pass
+        if limit_time is not None:
+            time, memory = limit_time, limit_memory
 
         return SubmissionData(
             time=time,
@@ -256,8 +357,9 @@ class JudgeHandler(ZlibPacketHandler):
 
         id = packet['submission-id']
         if Submission.objects.filter(id=id).update(status='P', judged_on=self.judge):
-            event.post('sub_%s' % Submission.get_id_secret(id), {'type': 'processing'})
-            self._post_update_submission(id, 'processing')
+            self._post_update_submission(id, 'processing', messages=[
+                ('sub_%s' % self._get_id_secret(id), {'type': 'processing'}),
+            ])
             json_log.info(self._make_json_log(packet, action='processing'))
         else:
             logger.warning('Unknown submission: %s', id)
@@ -326,13 +428,18 @@ class JudgeHandler(ZlibPacketHandler):
     def on_grading_begin(self, packet):
         logger.info('%s: Grading has begun on: %s', self.name, packet['submission-id'])
         self.batch_id = None
+        self._test_case_buffer = []
+        self._case_groups_id = packet['submission-id']
+        self._case_groups = {}
+        self._case_statuses = set()
 
         if Submission.objects.filter(id=packet['submission-id']).update(
                 status='G', is_pretested=packet['pretested'], current_testcase=1,
                 batch=False, judged_date=timezone.now()):
             SubmissionTestCase.objects.filter(submission_id=packet['submission-id']).delete()
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'grading-begin'})
-            self._post_update_submission(packet['submission-id'], 'grading-begin')
+            self._post_update_submission(packet['submission-id'], 'grading-begin', messages=[
+                ('sub_%s' % self._get_id_secret(packet['submission-id']), {'type': 'grading-begin'}),
+            ])
             json_log.info(self._make_json_log(packet, action='grading-begin'))
         else:
             logger.warning('Unknown submission: %s', packet['submission-id'])
@@ -340,11 +447,15 @@ class JudgeHandler(ZlibPacketHandler):
 
     def on_grading_end(self, packet):
         logger.info('%s: Grading has ended on: %s', self.name, packet['submission-id'])
+        self._flush_test_cases(packet['submission-id'])
         self._free_self(packet)
         self.batch_id = None
 
         try:
-            submission = Submission.objects.get(id=packet['submission-id'])
+            submission = (Submission.objects.select_related('problem', 'user', 'contest__problem',
+                                                            'contest__participation')
+                                            .defer('problem__description', 'problem__summary', 'user__about')
+                                            .get(id=packet['submission-id']))
         except Submission.DoesNotExist:
             logger.warning('Unknown submission: %s', packet['submission-id'])
             json_log.error(self._make_json_log(packet, action='grading-end', info='unknown submission'))
@@ -354,29 +465,32 @@ class JudgeHandler(ZlibPacketHandler):
         memory = 0
         points = 0.0
         total = 0
-        status = 0
-        status_codes = ['SC', 'AC', 'WA', 'MLE', 'TLE', 'IR', 'RTE', 'OLE']
-        batches = {}  # batch number: (points, total)
-
-        for case in SubmissionTestCase.objects.filter(submission=submission):
-            time += case.time
-            if not case.batch:
-                points += case.points
-                total += case.total
+
+        # Cases outside of a batch are all lumped into the group with a null batch.
+        if self._case_groups_id == submission.id:
+            groups = self._case_groups.values()
+            statuses = self._case_statuses
+        else:
+            # We did not see grading begin, e.g. if the bridge restarted, so let the database do the summing.
+            cases = SubmissionTestCase.objects.filter(submission=submission)
+            groups = cases.values('batch').annotate(
+                time_sum=Sum('time'), memory_max=Max('memory'), points_sum=Sum('points'), points_min=Min('points'),
+                total_sum=Sum('total'), total_max=Max('total'),
+            ).order_by()
+            statuses = cases.values_list('status', flat=True).distinct()
+        self._case_groups_id = None
+
+        for group in groups:
+            time += group['time_sum'] or 0
+            memory = max(memory, group['memory_max'] or 0)
+            if not group['batch']:
+                points += group['points_sum'] or 0
+                total += group['total_sum'] or 0
             else:
-                if case.batch in batches:
-                    batches[case.batch][0] = min(batches[case.batch][0], case.points)
-                    batches[case.batch][1] = max(batches[case.batch][1], case.total)
-                else:
-                    batches[case.batch] = [case.points, case.total]
-            memory = max(memory, case.memory)
-            i = status_codes.index(case.status)
-            if i > status:
-                status = i
-
-        for i in batches:
-            points += batches[i][0]
-            total += batches[i][1]
+                points += group['points_min'] or 0
+                total += group['total_max'] or 0
+
+        status = max((STATUS_PRIORITY[code] for code in statuses), default=0)
 
         points = round(points, 1)
         total = round(total, 1)
@@ -392,8 +506,8 @@ class JudgeHandler(ZlibPacketHandler):
         submission.time = time
         submission.memory = memory
         submission.points = sub_points
-        submission.result = status_codes[status]
-        submission.save()
+        submission.result = STATUS_CODES[status]
+        submission.save(update_fields=['status', 'time', 'memory', 'points', 'result', 'case_points', 'case_total'])
 
         json_log.info(self._make_json_log(
             packet, action='grading-end', time=time, memory=memory,
@@ -402,39 +516,51 @@ class JudgeHandler(ZlibPacketHandler):
             problem=problem.code, finish=True,
         ))
 
-        if problem.is_public and not problem.is_organization_private:
-            submission.user._updating_stats_only = True
-            submission.user.calculate_points()
+        defer_stats = can_defer_stats()
+        if defer_stats:
+            # Many submissions finishing at once only need a single recalculation each.
+            if problem.is_public and not problem.is_organization_private:
+                delay_once(recalculate_user_points, submission.user_id)
+            delay_once(update_problem_stats, problem.id)
+            submission.update_contest(recompute=False)
+            if hasattr(submission, 'contest'):
+                delay_once(recompute_participation, submission.contest.participation_id)
+        else:
+            if problem.is_public and not problem.is_organization_private:
+                submission.user._updating_stats_only = True
+                submission.user.calculate_points()
 
-        problem._updating_stats_only = True
-        problem.update_stats()
-        submission.update_contest()
+            problem._updating_stats_only = True
+            problem.update_stats()
+            submission.update_contest()
 
-        finished_submission(submission)
+        _run_in_background(finished_submission, submission)
 
-        event.post('sub_%s' % submission.id_secret, {
+        messages = [('sub_%s' % submission.id_secret, {
             'type': 'grading-end',
             'time': time,
             'memory': memory,
             'points': float(points),
             'total': float(problem.points),
             'result': submission.result,
-        })
-        if hasattr(submission, 'contest'):
+        })]
+        # Deferred contest scores are not updated yet, recompute_participation posts the update when they are.
+        if hasattr(submission, 'contest') and not defer_stats:
             participation = submission.contest.participation
-            event.post('contest_%d' % participation.contest_id, {'type': 'update'})
-        self._post_update_submission(submission.id, 'grading-end', done=True)
+            messages.append(('contest_%d' % participation.contest_id, {'type': 'update'}))
+        self._post_update_submission(submission.id, 'grading-end', done=True, messages=messages)
 
     def on_compile_error(self, packet):
         logger.info('%s: Submission failed to compile: %s', self.name, packet['submission-id'])
         self._free_self(packet)
 
         if Submission.objects.filter(id=packet['submission-id']).update(status='CE', result='CE', error=packet['log']):
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {
-                'type': 'compile-error',
-                'log': packet['log'],
-            })
-            self._post_update_submission(packet['submission-id'], 'compile-error', done=True)
+            self._post_update_submission(packet['submission-id'], 'compile-error', done=True, messages=[
+                ('sub_%s' % self._get_id_secret(packet['submission-id']), {
+                    'type': 'compile-error',
+                    'log': packet['log'],
+                }),
+            ])
             json_log.info(self._make_json_log(packet, action='compile-error', log=packet['log'],
                                               finish=True, result='CE'))
         else:
@@ -446,7 +572,8 @@ class JudgeHandler(ZlibPacketHandler):
         logger.info('%s: Submission generated compiler messages: %s', self.name, packet['submission-id'])
 
         if Submission.objects.filter(id=packet['submission-id']).update(error=packet['log']):
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'compile-message'})
+            _run_in_background(event.post, 'sub_%s' % self._get_id_secret(packet['submission-id']),
+                               {'type': 'compile-message'})
             json_log.info(self._make_json_log(packet, action='compile-message', log=packet['log']))
         else:
             logger.warning('Unknown submission: %s', packet['submission-id'])
@@ -458,12 +585,14 @@ class JudgeHandler(ZlibPacketHandler):
             raise ValueError('\n\n' + packet['message'])
         except ValueError:
             logger.exception('Judge %s failed while handling submission %s', self.name, packet['submission-id'])
+        self._flush_test_cases(packet['submission-id'])
         self._free_self(packet)
 
         id = packet['submission-id']
         if Submission.objects.filter(id=id).update(status='IE', result='IE', error=packet['message']):
-            event.post('sub_%s' % Submission.get_id_secret(id), {'type': 'internal-error'})
-            self._post_update_submission(id, 'internal-error', done=True)
+            self._post_update_submission(id, 'internal-error', done=True, messages=[
+                ('sub_%s' % self._get_id_secret(id), {'type': 'internal-error'}),
+            ])
             json_log.info(self._make_json_log(packet, action='internal-error', message=packet['message'],
                                               finish=True, result='IE'))
         else:
@@ -473,11 +602,13 @@ class JudgeHandler(ZlibPacketHandler):
 
     def on_submission_terminated(self, packet):
         logger.info('%s: Submission aborted: %s', self.name, packet['submission-id'])
+        self._flush_test_cases(packet['submission-id'])
         self._free_self(packet)
 
         if Submission.objects.filter(id=packet['submission-id']).update(status='AB', result='AB', points=0):
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'aborted-submission'})
-            self._post_update_submission(packet['submission-id'], 'terminated', done=True)
+            self._post_update_submission(packet['submission-id'], 'terminated', done=True, messages=[
+                ('sub_%s' % self._get_id_secret(packet['submission-id']), {'type': 'aborted-submission'}),
+            ])
             json_log.info(self._make_json_log(packet, action='aborted', finish=True, result='AB'))
         else:
             logger.warning('Unknown submission: %s', packet['submission-id'])
@@ -506,31 +637,9 @@ class JudgeHandler(ZlibPacketHandler):
         updates = packet['cases']
         max_position = max(map(itemgetter('position'), updates))
 
-        if not Submission.objects.filter(id=id).update(current_testcase=max_position + 1):
-            logger.warning('Unknown submission: %s', id)
-            json_log.error(self._make_json_log(packet, action='test-case', info='unknown submission'))
-            return
-
-        bulk_test_case_updates = []
         for result in updates:
             test_case = SubmissionTestCase(submission_id=id, case=result['position'])
-            status = result['status']
-            if status & 4:
-                test_case.status = 'TLE'
-            elif status & 8:
-                test_case.status = 'MLE'
-            elif status & 64:
-                test_case.status = 'OLE'
-            elif status & 2:
-                test_case.status = 'RTE'
-            elif status & 16:
-                test_case.status = 'IR'
-            elif status & 1:
-                test_case.status = 'WA'
-            elif status & 32:
-                test_case.status = 'SC'
-            else:
-                test_case.status = 'AC'
+            test_case.status = TEST_CASE_STATUS[result['status'] & 127]
             test_case.time = result['time']
             test_case.memory = result['memory']
             test_case.points = result['points']
@@ -539,7 +648,9 @@ class JudgeHandler(ZlibPacketHandler):
             test_case.feedback = (result.get('feedback') or '')[:max_feedback]
             test_case.extended_feedback = result.get('extended-feedback') or ''
             test_case.output = result['output']
-            bulk_test_case_updates.append(test_case)
+            self._test_case_buffer.append(test_case)
+            if self._case_groups_id == id:
+                self._add_case_to_totals(test_case)
 
             json_log.info(self._make_json_log(
                 packet, action='test-case', case=test_case.case, batch=test_case.batch,
@@ -551,28 +662,56 @@ class JudgeHandler(ZlibPacketHandler):
                 runtime_version=result.get('runtime-version', ''),
             ))
 
-        do_post = True
+        # Token bucket allowing bursts of UPDATE_RATE_LIMIT updates, refilled over UPDATE_RATE_TIME.
+        now = time.monotonic()
+        tokens, last = self.update_counter.get(id, (UPDATE_RATE_LIMIT, now))
+        tokens = min(UPDATE_RATE_LIMIT, tokens + (now - last) * UPDATE_RATE_LIMIT / UPDATE_RATE_TIME)
+        do_post = tokens >= 1
+        if do_post:
+            tokens -= 1
+        self.update_counter[id] = (tokens, now)
 
-        if id in self.update_counter:
-            cnt, reset = self.update_counter[id]
-            cnt += 1
-            if time.monotonic() - reset > UPDATE_RATE_TIME:
-                del self.update_counter[id]
-            else:
-                self.update_counter[id] = (cnt, reset)
-                if cnt > UPDATE_RATE_LIMIT:
-                    do_post = False
-        if id not in self.update_counter:
-            self.update_counter[id] = (1, time.monotonic())
+        # Only hit the database when the update is about to be announced, or when enough cases pile up.
+        if do_post or len(self._test_case_buffer) >= TEST_CASE_BUFFER_SIZE:
+            if not self._flush_test_cases(id):
+                logger.warning('Unknown submission: %s', id)
+                json_log.error(self._make_json_log(packet, action='test-case', info='unknown submission'))
+                return
 
         if do_post:
-            event.post('sub_%s' % Submission.get_id_secret(id), {
-                'type': 'test-case',
-                'id': max_position,
-            })
-            self._post_update_submission(id, state='test-case')
-
-        SubmissionTestCase.objects.bulk_create(bulk_test_case_updates)
+            self._post_update_submission(id, state='test-case', messages=[
+                ('sub_%s' % self._get_id_secret(id), {
+                    'type': 'test-case',
+                    'id': max_position,
+                }),
+            ])
+
+    def _add_case_to_totals(self, case):
+        self._case_statuses.add(case.status)
+        group = self._case_groups.get(case.batch)
+        if group is None:
+            self._case_groups[case.batch] = {
+                'batch': case.batch, 'time_sum': case.time, 'memory_max': case.memory,
+                'points_sum': case.points, 'points_min': case.points,
+                'total_sum': case.total, 'total_max': case.total,
+            }
+        else:
+            group['time_sum'] += case.time
+            group['memory_max'] = max(group['memory_max'], case.memory)
+            group['points_sum'] += case.points
+            group['points_min'] = min(group['points_min'], case.points)
+            group['total_sum'] += case.total
+            group['total_max'] = max(group['total_max'], case.total)
+
+    def _flush_test_cases(self, id):
+        cases, self._test_case_buffer = self._test_case_buffer, []
+        if not cases:
+            return True
+        with transaction.atomic():
+            if not Submission.objects.filter(id=id).update(current_testcase=max(case.case for case in cases) + 1):
+                return False
+            SubmissionTestCase.objects.bulk_create(cases)
+        return True
 
     def on_malformed(self, packet):
         logger.error('%s: Malformed packet: %s', self.name, packet)
@@ -588,6 +727,7 @@ class JudgeHandler(ZlibPacketHandler):
         self._update_ping()
 
     def _free_self(self, packet):
+        self.update_counter.pop(packet['submission-id'], None)
         self.judges.on_judge_free(self, packet['submission-id'])
 
     def _ping_thread(self):
@@ -613,24 +753,38 @@ class JudgeHandler(ZlibPacketHandler):
         data.update(kwargs)
         return json.dumps(data)
 
-    def _post_update_submission(self, id, state, done=False):
+    def _get_id_secret(self, id):
+        # A judge only works on one submission at a time, so remembering the last one spares an HMAC per packet.
+        if self._id_secret_cache_id != id:
+            self._id_secret_cache = Submission.get_id_secret(id)
+            self._id_secret_cache_id = id
+        return self._id_secret_cache
+
+    def _post_update_submission(self, id, state, done=False, messages=()):
+        # Any other messages are posted in the same batch as the submission list update.
+        messages = list(messages)
         if self._submission_cache_id == id:
-            data = self._submission_cache
+            update = self._submission_cache
         else:
-            self._submission_cache = data = Submission.objects.filter(id=id).values(
+            data = Submission.objects.filter(id=id).values(
                 'problem__is_public', 'contest_object_id',
                 'user_id', 'problem_id', 'status', 'language__key',
             ).get()
-            self._submission_cache_id = id
-
-        if data['problem__is_public']:
-            event.post('submissions', {
-                'type': 'done-submission' if done else 'update-submission',
-                'state': state, 'id': id,
+            # Only the type and state vary between updates, so build the rest of the message once per submission.
+            self._submission_cache = update = {
+                'id': id,
                 'contest': data['contest_object_id'],
                 'user': data['user_id'], 'problem': data['problem_id'],
                 'status': data['status'], 'language': data['language__key'],
-            })
+            } if data['problem__is_public'] else None
+            self._submission_cache_id = id
+
+        if update is not None:
+            # Copy, since the message is serialized later on the background thread.
+            messages.append(('submissions', dict(update, type='done-submission' if done else 'update-submission',
+                                                 state=state)))
+        if messages:
+            _run_in_background(event.post_many, messages)
 
     def on_cleanup(self):
         db.connection.close()
@@ -0,0 +1,179 @@
+from time import monotonic
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.db.models import Max, Min, Sum
+from django.test import TestCase, override_settings
+
+from judge.bridge.judge_handler import JudgeHandler, STATUS_CODES, STATUS_PRIORITY, TEST_CASE_BUFFER_SIZE, \
+    can_defer_stats
+from judge.models import Language, Submission, SubmissionTestCase
+from judge.models.tests.util import CommonDataMixin, create_problem
+from judge.tasks import update_problem_stats
+from judge.tasks.tests.test_stats import PendingProbe
+from judge.utils.celery import delay_once
+
+
+class FakeJudgeList:
+    def on_judge_free(self, judge, submission):
+        pass
+
+
+def make_handler():
+    # Skip RequestHandlerMeta, which would start handling packets from the (missing) socket right away.
+    handler = JudgeHandler.__new__(JudgeHandler)
+    handler.__init__(None, ('127.0.0.1', 0), SimpleNamespace(server_address=('127.0.0.1', 9999)), FakeJudgeList())
+    handler.name = 'test-judge'
+    return handler
+
+
+def make_case(position, status=0, points=1, total=1, time=0.5, memory=1024):
+    return {'position': position, 'status': status, 'time': time, 'memory': memory,
+            'points': points, 'total-points': total, 'output': ''}
+
+
+def aggregate_cases(submission_id):
+    # The aggregation the bridge used to run over the stored test cases on grading end.
+    cases = SubmissionTestCase.objects.filter(submission_id=submission_id)
+    time = memory = points = total = 0
+    for group in cases.values('batch').annotate(
+        time_sum=Sum('time'), memory_max=Max('memory'), points_sum=Sum('points'), points_min=Min('points'),
+        total_sum=Sum('total'), total_max=Max('total'),
+    ).order_by():
+        time += group['time_sum'] or 0
+        memory = max(memory, group['memory_max'] or 0)
+        if not group['batch']:
+            points += group['points_sum'] or 0
+            total += group['total_sum'] or 0
+        else:
+            points += group['points_min'] or 0
+            total += group['total_max'] or 0
+    status = max((STATUS_PRIORITY[code] for code in cases.values_list('status', flat=True).distinct()), default=0)
+    return {'time': time, 'memory': memory, 'case_points': round(points, 1), 'case_total': round(total, 1),
+            'result': STATUS_CODES[status]}
+
+
+class JudgeHandlerTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.problem = create_problem(code='bridge_totals', points=10, partial=True)
+
+    def setUp(self):
+        self.submission = Submission.objects.create(
+            user=self.users['normal'].profile,
+            problem=self.problem,
+            language=Language.get_python3(),
+            status='QU',
+        )
+        self.submission_id = self.submission.id
+
+    def send_cases(self, handler, *cases):
+        handler.on_test_case({'submission-id': self.submission_id, 'cases': list(cases)})
+
+    def send_batch(self, handler, *cases):
+        handler.on_batch_begin({'submission-id': self.submission_id})
+        self.send_cases(handler, *cases)
+        handler.on_batch_end({'submission-id': self.submission_id})
+
+    def grade_mixed(self, handler):
+        handler.on_grading_begin({'submission-id': self.submission_id, 'pretested': False})
+        self.send_cases(handler, make_case(1, time=0.25, memory=2048), make_case(2, status=1, points=0))
+        self.send_batch(handler, make_case(3, points=2, total=2), make_case(4, status=4, points=0.5, total=2, time=1))
+        self.send_batch(handler, make_case(5, points=3, total=3, memory=4096), make_case(6, points=3, total=3))
+        self.send_cases(handler, make_case(7, points=0.5, total=1))
+
+    def count_cases(self):
+        return SubmissionTestCase.objects.filter(submission_id=self.submission_id).count()
+
+    def assertMatchesAggregation(self):
+        submission = Submission.objects.get(id=self.submission_id)
+        expected = aggregate_cases(self.submission_id)
+        self.assertEqual(expected, {
+            'time': submission.time, 'memory': submission.memory, 'case_points': submission.case_points,
+            'case_total': submission.case_total, 'result': submission.result,
+        })
+        return submission
+
+    def test_flushed_test_cases(self):
+        handler = make_handler()
+        self.grade_mixed(handler)
+        handler.on_grading_end({'submission-id': self.submission_id})
+
+        self.assertEqual(
+            list(SubmissionTestCase.objects.filter(submission_id=self.submission_id).order_by('case')
+                 .values_list('case', 'batch', 'status', 'points', 'total')),
+            [(1, None, 'AC', 1, 1), (2, None, 'WA', 0, 1), (3, 1, 'AC', 2, 2), (4, 1, 'TLE', 0.5, 2),
+             (5, 2, 'AC', 3, 3), (6, 2, 'AC', 3, 3), (7, None, 'AC', 0.5, 1)],
+        )
+        submission = Submission.objects.get(id=self.submission_id)
+        self.assertTrue(submission.batch)
+        self.assertEqual(submission.current_testcase, 8)
+        self.assertEqual(submission.status, 'D')
+
+    def test_running_totals(self):
+        handler = make_handler()
+        self.grade_mixed(handler)
+        handler.on_grading_end({'submission-id': self.submission_id})
+
+        submission = self.assertMatchesAggregation()
+        # Cases 1, 2 and 7 count individually; each batch counts its lowest score out of its highest total.
+        self.assertEqual(submission.case_points, 1.5 + 0.5 + 3)
+        self.assertEqual(submission.case_total, 3 + 2 + 3)
+        self.assertEqual(submission.result, 'TLE')
+        self.assertEqual(submission.points, round(5 / 8 * 10, 3))
+
+    def test_totals_without_grading_begin(self):
+        # If the bridge restarts during grading, the new handler never sees grading begin and has no running totals.
+        handler = make_handler()
+        handler.on_grading_begin({'submission-id': self.submission_id, 'pretested': False})
+        self.send_cases(handler, make_case(1, points=0.5))
+        handler._flush_test_cases(self.submission_id)
+
+        handler = make_handler()
+        self.send_cases(handler, make_case(2, status=1, points=0, memory=8192))
+        self.send_batch(handler, make_case(3, points=2, total=2), make_case(4, points=1, total=2))
+        handler.on_grading_end({'submission-id': self.submission_id})
+
+        submission = self.assertMatchesAggregation()
+        self.assertEqual(submission.case_points, 0.5 + 0 + 1)
+        self.assertEqual(submission.case_total, 1 + 1 + 2)
+        self.assertEqual(submission.memory, 8192)
+        self.assertEqual(submission.result, 'WA')
+
+    def test_rate_limited_cases_are_buffered(self):
+        handler = make_handler()
+        handler.on_grading_begin({'submission-id': self.submission_id, 'pretested': False})
+        # An empty token bucket that will not refill during the test.
+        handler.update_counter[self.submission_id] = (0, monotonic() + 3600)
+        self.send_cases(handler, make_case(1))
+        self.assertEqual(self.count_cases(), 0)
+
+        # A full buffer is written out even without an update to announce.
+        self.send_cases(handler, *(make_case(position) for position in range(2, TEST_CASE_BUFFER_SIZE + 1)))
+        self.assertEqual(self.count_cases(), TEST_CASE_BUFFER_SIZE)
+
+        self.send_cases(handler, make_case(TEST_CASE_BUFFER_SIZE + 1))
+        handler.on_grading_end({'submission-id': self.submission_id})
+        self.assertEqual(self.count_cases(), TEST_CASE_BUFFER_SIZE + 1)
+        self.assertMatchesAggregation()
+
+    @override_settings(BRIDGED_DEFER_STATS=True)
+    def test_stats_not_deferred_with_local_cache(self):
+        # The test cache is a per-process LocMemCache, which a Celery worker could never clear pending marks in.
+        self.assertFalse(can_defer_stats())
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.assertTrue(can_defer_stats())
+
+        cache.clear()
+        handler = make_handler()
+        handler.on_grading_begin({'submission-id': self.submission_id, 'pretested': False})
+        self.send_cases(handler, make_case(1))
+        handler.on_grading_end({'submission-id': self.submission_id})
+
+        # The problem statistics were updated inline, and nothing was left pending for Celery.
+        self.problem.refresh_from_db()
+        self.assertEqual(self.problem.user_count, 1)
+        probe = PendingProbe(update_problem_stats)
+        delay_once(probe, self.problem.id)
+        self.assertEqual(probe.calls, 1)
@@ -1,4 +1,7 @@
+import random
+
 from django.core.cache import cache
+from django.db import transaction
 
 
 def finished_submission(sub):
@@ -8,3 +11,37 @@ def finished_submission(sub):
         keys += ['contest_complete:%d' % participation.id]
         keys += ['contest_attempted:%d' % participation.id]
     cache.delete_many(keys)
+
+
+# Cached contest rankings are invalidated by bumping a version in their key rather than by deleting them. A ranking
+# built from rows read before an update is then stored under the old version, where no later request looks for it.
+# The global version covers what is shown in every ranking, such as users' names, ratings and organizations.
+def _contest_ranking_version_keys(contest_id):
+    return 'contest_ranking_version:%d' % contest_id, 'contest_ranking_version'
+
+
+def contest_ranking_key(contest_id):
+    keys = _contest_ranking_version_keys(contest_id)
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # Start from a random version, so that rankings stored under an evicted version are never read again.
+        for key in missing:
+            cache.add(key, random.getrandbits(32), None)
+        versions.update(cache.get_many(missing))
+    return 'contest_ranking_rows:%d:%s:%s' % (contest_id, versions.get(keys[0]), versions.get(keys[1]))
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # There is no version yet, so nothing is cached under it.
+        pass
+
+
+def update_contest_ranking(contest_id=None):
+    # Without a contest, every contest's ranking is invalidated. Bump only once the changes are visible to others,
+    # otherwise a ranking could be rebuilt from the old rows and stored under the new version.
+    key = 'contest_ranking_version' if contest_id is None else _contest_ranking_version_keys(contest_id)[0]
+    transaction.on_commit(lambda: _bump_version(key))
@@ -5,7 +5,6 @@ from django.db import connection
 from django.template.defaultfilters import floatformat
 from django.urls import reverse
 from django.utils.html import format_html
-from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _, gettext_lazy, ngettext
 
 from judge.contest_format.default import DefaultContestFormat
@@ -111,7 +110,7 @@ class AtCoderContestFormat(DefaultContestFormat):
                 time=nice_repr(timedelta(seconds=format_data['time']), 'noday'),
             )
         else:
-            return mark_safe('<td></td>')
+            return self.display_empty_user_problem(contest_problem)
 
     def get_short_form_display(self):
         yield _('The maximum score submission for each problem will be used.')
@@ -1,5 +1,7 @@
 from abc import ABCMeta, abstractmethod
 
+from django.utils.safestring import mark_safe
+
 
 class abstractclassmethod(classmethod):
     __isabstractmethod__ = True
@@ -59,6 +61,16 @@ class BaseContestFormat(metaclass=ABCMeta):
         """
         raise NotImplementedError()
 
+    def display_empty_user_problem(self, contest_problem):
+        """
+        Returns the HTML fragment to show for a problem the user has no results on, e.g. when the participation has no
+        format_data yet.
+
+        :param contest_problem: The ContestProblem object representing the problem in question.
+        :return: An HTML fragment, marked as safe for Jinja2.
+        """
+        return mark_safe('<td></td>')
+
     @abstractmethod
     def display_participation_result(self, participation):
         """
@@ -5,7 +5,6 @@ from django.db.models import Max
 from django.template.defaultfilters import floatformat
 from django.urls import reverse
 from django.utils.html import format_html
-from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _, gettext_lazy
 
 from judge.contest_format.base import BaseContestFormat
@@ -58,7 +57,7 @@ class DefaultContestFormat(BaseContestFormat):
                 time=nice_repr(timedelta(seconds=format_data['time']), 'noday'),
             )
         else:
-            return mark_safe('<td></td>')
+            return self.display_empty_user_problem(contest_problem)
 
     def display_participation_result(self, participation):
         return format_html(
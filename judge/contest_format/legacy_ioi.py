@@ -5,7 +5,6 @@ from django.db.models import Min, OuterRef, Subquery
 from django.template.defaultfilters import floatformat
 from django.urls import reverse
 from django.utils.html import format_html
-from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _, gettext_lazy
 
 from judge.contest_format.default import DefaultContestFormat
@@ -82,7 +81,7 @@ class LegacyIOIContestFormat(DefaultContestFormat):
                 time=nice_repr(timedelta(seconds=format_data['time']), 'noday') if self.config['cumtime'] else '',
             )
         else:
-            return mark_safe('<td></td>')
+            return self.display_empty_user_problem(contest_problem)
 
     def display_participation_result(self, participation):
         return format_html(
@@ -1,6 +1,6 @@
 from django.conf import settings
 
-__all__ = ['last', 'post']
+__all__ = ['last', 'post', 'post_many']
 
 if not settings.EVENT_DAEMON_USE:
     real = False
@@ -8,11 +8,14 @@ if not settings.EVENT_DAEMON_USE:
     def post(channel, message):
         return 0
 
+    def post_many(messages):
+        return [0] * len(messages)
+
     def last():
         return 0
 elif hasattr(settings, 'EVENT_DAEMON_AMQP'):
-    from .event_poster_amqp import last, post
+    from .event_poster_amqp import last, post, post_many
     real = True
 else:
-    from .event_poster_ws import last, post
+    from .event_poster_ws import last, post, post_many
     real = True
@@ -1,13 +1,18 @@
 import json
 import socket
 import threading
+from time import monotonic
 
 from django.conf import settings
 from websocket import WebSocketException, create_connection
 
-__all__ = ['EventPostingError', 'EventPoster', 'post', 'last']
+__all__ = ['EventPostingError', 'EventPoster', 'post', 'post_many', 'last']
 _local = threading.local()
 
+# Clients only use the last message id as a point to resume from, so a few seconds of staleness is harmless.
+LAST_ID_TTL = 5
+_last_id = (0, 0.0)
+
 
 class EventPostingError(RuntimeError):
     pass
@@ -39,6 +44,24 @@ class EventPoster(object):
             self._connect()
             return self.post(channel, message, tries + 1)
 
+    def post_many(self, messages, tries=0):
+        try:
+            # Send everything before reading any response, so that the whole batch only costs one round trip.
+            for channel, message in messages:
+                self._conn.send(json.dumps({'command': 'post', 'channel': channel, 'message': message}))
+            ids = []
+            for _ in messages:
+                resp = json.loads(self._conn.recv())
+                if resp['status'] == 'error':
+                    raise EventPostingError(resp['code'])
+                ids.append(resp['id'])
+            return ids
+        except WebSocketException:
+            if tries > 10:
+                raise
+            self._connect()
+            return self.post_many(messages, tries + 1)
+
     def last(self, tries=0):
         try:
             self._conn.send('{"command": "last-msg"}')
@@ -71,12 +94,30 @@ def post(channel, message):
     return 0
 
 
+def post_many(messages):
+    try:
+        return _get_poster().post_many(messages)
+    except (WebSocketException, socket.error):
+        try:
+            del _local.poster
+        except AttributeError:
+            pass
+    return [0] * len(messages)
+
+
 def last():
+    global _last_id
+    id, expires = _last_id
+    if monotonic() < expires:
+        return id
+
     try:
-        return _get_poster().last()
+        id = _get_poster().last()
     except (WebSocketException, socket.error):
         try:
             del _local.poster
         except AttributeError:
             pass
-    return 0
+        return 0
+    _last_id = (id, monotonic() + LAST_ID_TTL)
+    return id
@@ -1,7 +1,9 @@
 import json
 import logging
+import os
 import socket
 import struct
+import threading
 import zlib
 
 from django.conf import settings
@@ -12,6 +14,7 @@ from judge.judge_priority import BATCH_REJUDGE_PRIORITY, CONTEST_SUBMISSION_PRIO
 
 logger = logging.getLogger('judge.judgeapi')
 size_pack = struct.Struct('!I')
+_local = threading.local()
 
 
 def _post_update_submission(submission, done=False):
@@ -23,29 +26,72 @@ def _post_update_submission(submission, done=False):
                                    'status': submission.status, 'language': submission.language.key})
 
 
-def judge_request(packet, reply=True):
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ValueError('Judge did not respond')
+        received += count
+    return buffer
+
+
+def _get_connection():
+    sock = getattr(_local, 'sock', None)
+    # Connections are per thread, so requests never interleave on one, but a forked worker must not share its
+    # parent's connection either.
+    if sock is not None and _local.pid == os.getpid():
+        return sock, False
+
     sock = socket.create_connection(settings.BRIDGED_DJANGO_CONNECT or
                                     settings.BRIDGED_DJANGO_ADDRESS[0])
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    _local.sock = sock
+    _local.pid = os.getpid()
+    return sock, True
 
-    output = json.dumps(packet, separators=(',', ':'))
-    output = zlib.compress(output.encode('utf-8'))
-    writer = sock.makefile('wb')
-    writer.write(size_pack.pack(len(output)))
-    writer.write(output)
-    writer.close()
 
-    if reply:
-        reader = sock.makefile('rb', -1)
-        input = reader.read(size_pack.size)
-        if not input:
-            raise ValueError('Judge did not respond')
-        length = size_pack.unpack(input)[0]
-        input = reader.read(length)
-        if not input:
-            raise ValueError('Judge did not respond')
-        reader.close()
+def _close_connection():
+    sock = _local.__dict__.pop('sock', None)
+    if sock is not None:
         sock.close()
 
+
+def judge_request(packet, reply=True):
+    output = json.dumps(packet, separators=(',', ':'))
+    output = zlib.compress(output.encode('utf-8'), 1)
+
+    while True:
+        sock, fresh = _get_connection()
+        try:
+            try:
+                sock.sendall(size_pack.pack(len(output)) + output)
+                # The bridge always replies, so the reply must be drained to keep the connection usable.
+                header = sock.recv(size_pack.size)
+            except OSError:
+                if fresh:
+                    raise
+                header = b''
+            if not header:
+                if fresh:
+                    raise ValueError('Judge did not respond')
+                # A reused connection that fails before any of the reply arrives was closed by the bridge while
+                # idle, so retry on a new one. Once the bridge has started replying, a retry could repeat the request.
+                _close_connection()
+                continue
+            if len(header) < size_pack.size:
+                header += _recv_exact(sock, size_pack.size - len(header))
+            input = _recv_exact(sock, size_pack.unpack(header)[0])
+        except BaseException:
+            # Unless the whole reply was read, the next request on this connection would read the rest of this one.
+            _close_connection()
+            raise
+        break
+
+    if reply:
         result = json.loads(zlib.decompress(input).decode('utf-8'))
         return result
 
@@ -55,14 +101,14 @@ def judge_submission(submission, rejudge=False, batch_rejudge=False, judge_id=No
 
     updates = {'time': None, 'memory': None, 'points': None, 'result': None, 'case_points': 0, 'case_total': 0,
                'error': None, 'rejudged_date': timezone.now() if rejudge or batch_rejudge else None, 'status': 'QU'}
-    try:
-        # This is set proactively; it might get unset in judgecallback's on_grading_begin if the problem doesn't
-        # actually have pretests stored on the judge.
-        updates['is_pretested'] = all(ContestSubmission.objects.filter(submission=submission)
-                                      .values_list('problem__contest__run_pretests_only', 'problem__is_pretested')[0])
-    except IndexError:
+    pretest_flags = (ContestSubmission.objects.filter(submission=submission)
+                     .values_list('problem__contest__run_pretests_only', 'problem__is_pretested').first())
+    if pretest_flags is None:
         priority = DEFAULT_PRIORITY
     else:
+        # This is set proactively; it might get unset in judgecallback's on_grading_begin if the problem doesn't
+        # actually have pretests stored on the judge.
+        updates['is_pretested'] = all(pretest_flags)
         priority = CONTEST_SUBMISSION_PRIORITY
 
     # This should prevent double rejudge issues by permitting only the judging of
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0144_submission_index_cleanup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contestsubmission',
+            index=models.Index(fields=['participation', 'problem'], name='judge_conte_partici_e50515_idx'),
+        ),
+    ]
@@ -363,23 +363,14 @@ class Contest(models.Model):
         if self.view_contest_scoreboard.filter(id=user.profile.id).exists():
             return
 
-        in_org = (self.organizations.filter(id__in=user.profile.organizations.all()).exists() or
-                  self.classes.filter(id__in=user.profile.classes.all()).exists())
-        in_users = self.private_contestants.filter(id=user.profile.id).exists()
-
-        if not self.is_private and self.is_organization_private:
-            if in_org:
-                return
-            raise self.PrivateContest()
-
-        if self.is_private and not self.is_organization_private:
-            if in_users:
-                return
+        # Only probe the memberships that this contest's privacy settings require.
+        if self.is_private and not self.private_contestants.filter(id=user.profile.id).exists():
             raise self.PrivateContest()
 
-        if self.is_private and self.is_organization_private:
-            if in_org and in_users:
-                return
+        if self.is_organization_private and not (
+            self.organizations.filter(id__in=user.profile.organizations.all()).exists() or
+            self.classes.filter(id__in=user.profile.classes.all()).exists()
+        ):
             raise self.PrivateContest()
 
     # Assumes the user can access, to avoid the cost again
@@ -448,8 +439,14 @@ class Contest(models.Model):
 
         queryset = cls.objects.defer('description')
         if not (user.has_perm('judge.see_private_contest') or user.has_perm('judge.edit_all_contest')):
-            org_check = (Q(organizations__in=user.profile.organizations.all()) |
-                         Q(classes__in=user.profile.classes.all()))
+            # Check membership with subqueries on the through tables rather than joining them into
+            # the main query, where they multiply the rows that DISTINCT then has to collapse.
+            org_ids = list(user.profile.organizations.values_list('id', flat=True))
+            class_ids = list(user.profile.classes.values_list('id', flat=True))
+            org_check = (
+                Q(id__in=cls.organizations.through.objects.filter(organization_id__in=org_ids).values('contest_id')) |
+                Q(id__in=cls.classes.through.objects.filter(class_id__in=class_ids).values('contest_id'))
+            )
             q = Q(is_visible=True)
             q &= (
                 Q(view_contest_scoreboard=user.profile) |
@@ -627,6 +624,11 @@ class ContestSubmission(models.Model):
         verbose_name = _('contest submission')
         verbose_name_plural = _('contest submissions')
 
+        indexes = [
+            # For per-participation scoring in the contest formats
+            models.Index(fields=['participation', 'problem']),
+        ]
+
 
 class Rating(models.Model):
     user = models.ForeignKey(Profile, verbose_name=_('user'), related_name='ratings', on_delete=CASCADE)
@@ -169,7 +169,7 @@ class Submission(models.Model):
 
         return False
 
-    def update_contest(self):
+    def update_contest(self, recompute=True):
         try:
             contest = self.contest
         except AttributeError:
@@ -181,7 +181,8 @@ class Submission(models.Model):
         if not contest_problem.partial and contest.points != contest_problem.points:
             contest.points = 0
         contest.save()
-        contest.participation.recompute_results()
+        if recompute:
+            contest.participation.recompute_results()
 
     update_contest.alters_data = True
 
@@ -8,6 +8,8 @@ from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.translation import gettext_lazy
 
+from judge.caching import update_contest_ranking
+
 
 BETA2 = 328.33 ** 2
 RATING_INIT = 1200      # Newcomer's rating when applying the rating floor/ceiling
@@ -170,11 +172,11 @@ def rate_contest(contest):
     historical_p = [[] for _ in users]
 
     user_id_to_idx = {uid: i for i, uid in enumerate(user_ids)}
-    for h in Rating.objects.filter(user_id__in=user_ids) \
+    # Every past rating of every participant: stream it rather than caching the whole result on the queryset.
+    for user_id, performance in Rating.objects.filter(user_id__in=user_ids) \
             .order_by('-contest__end_time') \
-            .values('user_id', 'performance'):
-        idx = user_id_to_idx[h['user_id']]
-        historical_p[idx].append(h['performance'])
+            .values_list('user_id', 'performance').iterator(chunk_size=10000):
+        historical_p[user_id_to_idx[user_id]].append(performance)
 
     rating, mean, performance = recalculate_ratings(ranking, old_mean, times_ranked, historical_p)
 
@@ -189,6 +191,9 @@ def rate_contest(contest):
             rating=Subquery(Rating.objects.filter(user=OuterRef('id'))
                             .order_by('-contest__end_time').values('rating')[:1]))
 
+    # Users' ratings are shown in every contest's ranking.
+    update_contest_ranking()
+
 
 RATING_LEVELS = [
     gettext_lazy('Newbie'),
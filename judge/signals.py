@@ -8,9 +8,9 @@ from django.core.cache.utils import make_template_fragment_key
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from .caching import finished_submission
-from .models import BlogPost, Comment, Contest, ContestSubmission, EFFECTIVE_MATH_ENGINES, Judge, Language, License, \
-    MiscConfig, Organization, Problem, Profile, Submission, WebAuthnCredential
+from .caching import finished_submission, update_contest_ranking
+from .models import BlogPost, Comment, Contest, ContestParticipation, ContestSubmission, EFFECTIVE_MATH_ENGINES, \
+    Judge, Language, License, MiscConfig, Organization, Problem, Profile, Submission, WebAuthnCredential
 
 
 def get_pdf_path(basename: str) -> Optional[str]:
@@ -59,6 +59,10 @@ def profile_update(sender, instance, **kwargs):
                        for engine in EFFECTIVE_MATH_ENGINES] +
                       [make_template_fragment_key('org_member_count', (org_id,))
                        for org_id in instance.organizations.values_list('id', flat=True)])
+    # Only these profile fields are shown in contest rankings, and profiles are often saved for other reasons.
+    update_fields = kwargs.get('update_fields')
+    if update_fields is None or not update_fields.isdisjoint(('display_rank', 'rating', 'username_display_override')):
+        update_contest_ranking()
 
 
 @receiver(post_delete, sender=WebAuthnCredential)
@@ -77,6 +81,7 @@ def contest_update(sender, instance, **kwargs):
     cache.delete_many(['generated-meta-contest:%d' % instance.id] +
                       [make_template_fragment_key('contest_html', (instance.id, engine))
                        for engine in EFFECTIVE_MATH_ENGINES])
+    update_contest_ranking(instance.id)
 
 
 @receiver(post_save, sender=License)
@@ -85,9 +90,10 @@ def license_update(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
 def language_update(sender, instance, **kwargs):
     cache.delete_many([make_template_fragment_key('language_html', (instance.id,)),
-                       'lang:cn_map'])
+                       'lang:cn_map', 'lang:default:%s' % settings.DEFAULT_USER_LANGUAGE])
 
 
 @receiver(post_save, sender=Judge)
@@ -120,6 +126,13 @@ def submission_delete(sender, instance, **kwargs):
     instance.problem.update_stats()
 
 
+@receiver(post_save, sender=ContestParticipation)
+@receiver(post_delete, sender=ContestParticipation)
+def contest_participation_update(sender, instance, **kwargs):
+    cache.delete('cp:%d' % instance.id)
+    update_contest_ranking(instance.contest_id)
+
+
 @receiver(post_delete, sender=ContestSubmission)
 def contest_submission_delete(sender, instance, **kwargs):
     participation = instance.participation
@@ -131,6 +144,7 @@ def contest_submission_delete(sender, instance, **kwargs):
 def organization_update(sender, instance, **kwargs):
     cache.delete_many([make_template_fragment_key('organization_html', (instance.id, engine))
                        for engine in EFFECTIVE_MATH_ENGINES])
+    update_contest_ranking()
 
 
 @receiver(post_save, sender=MiscConfig)
@@ -4,10 +4,19 @@ from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import gettext as _
 from moss import MOSS
 
+from judge import event_poster as event
 from judge.models import Contest, ContestMoss, ContestParticipation, Submission
-from judge.utils.celery import Progress
+from judge.utils.celery import Progress, clear_pending
 
-__all__ = ('rescore_contest', 'run_moss')
+__all__ = ('recompute_participation', 'rescore_contest', 'run_moss')
+
+
+@shared_task(bind=True)
+def recompute_participation(self, participation_id):
+    clear_pending(self, participation_id)
+    participation = ContestParticipation.objects.get(id=participation_id)
+    participation.recompute_results()
+    event.post('contest_%d' % participation.contest_id, {'type': 'update'})
 
 
 @shared_task(bind=True)
@@ -5,9 +5,9 @@ from django.utils import timezone
 from django.utils.translation import gettext as _
 
 from judge.models import Problem, Profile, Submission
-from judge.utils.celery import Progress
+from judge.utils.celery import Progress, clear_pending
 
-__all__ = ('apply_submission_filter', 'rejudge_problem_filter', 'rescore_problem')
+__all__ = ('apply_submission_filter', 'rejudge_problem_filter', 'rescore_problem', 'update_problem_stats')
 
 
 def apply_submission_filter(queryset, id_range, languages, results):
@@ -69,3 +69,11 @@ def rescore_problem(self, problem_id):
             if users % 10 == 0:
                 p.done = users
     return rescored
+
+
+@shared_task(bind=True)
+def update_problem_stats(self, problem_id):
+    clear_pending(self, problem_id)
+    problem = Problem.objects.get(id=problem_id)
+    problem._updating_stats_only = True
+    problem.update_stats()
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from judge.models import ContestSubmission, Language, Submission
+from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
+    create_contest_problem, create_problem
+from judge.tasks import recalculate_user_points, recompute_participation, update_problem_stats
+from judge.utils.celery import delay_once
+
+
+class PendingProbe:
+    # Shares the real task's name, so delay_once() sees the pending mark the bridge would leave for it.
+    def __init__(self, task):
+        self.name = task.name
+        self.calls = 0
+
+    def delay(self, *args):
+        self.calls += 1
+
+
+class StatsTaskTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.profile = self.users['normal'].profile
+        self.problem = create_problem(code='deferred_stats', points=10, is_public=True)
+        self.contest = create_contest(key='deferred_stats')
+        self.participation = create_contest_participation(contest=self.contest, user=self.profile)
+
+        submission = Submission.objects.create(
+            user=self.profile,
+            problem=self.problem,
+            language=Language.get_python3(),
+            result='AC',
+            status='D',
+            points=10,
+            case_points=1,
+            case_total=1,
+        )
+        ContestSubmission.objects.create(
+            submission=submission,
+            problem=create_contest_problem(contest=self.contest, problem=self.problem),
+            participation=self.participation,
+            points=100,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertClearsPending(self, task, *args):
+        probe = PendingProbe(task)
+        delay_once(probe, *args)
+        task(*args)
+        delay_once(probe, *args)
+        self.assertEqual(probe.calls, 2)
+
+    def test_recalculate_user_points(self):
+        self.assertClearsPending(recalculate_user_points, self.profile.id)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.points, 10)
+        self.assertEqual(self.profile.problem_count, 1)
+
+    def test_update_problem_stats(self):
+        self.assertClearsPending(update_problem_stats, self.problem.id)
+        self.problem.refresh_from_db()
+        self.assertEqual(self.problem.user_count, 1)
+        self.assertEqual(self.problem.ac_rate, 100)
+
+    def test_recompute_participation(self):
+        self.assertClearsPending(recompute_participation, self.participation.id)
+        self.participation.refresh_from_db()
+        self.assertEqual(self.participation.score, 100)
+        self.assertIn(str(self.contest.contest_problems.get().id), self.participation.format_data)
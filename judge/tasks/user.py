@@ -8,12 +8,12 @@ from celery import shared_task
 from django.conf import settings
 from django.utils.translation import gettext as _
 
-from judge.models import Comment, Problem, Submission
-from judge.utils.celery import Progress
+from judge.models import Comment, Problem, Profile, Submission
+from judge.utils.celery import Progress, clear_pending
 from judge.utils.raw_sql import use_straight_join
 from judge.utils.unicode import utf8bytes
 
-__all__ = ('prepare_user_data',)
+__all__ = ('prepare_user_data', 'recalculate_user_points')
 rewildcard = re.compile(r'\*+')
 
 
@@ -119,3 +119,11 @@ def prepare_user_data(self, profile_id, options):
                     f.write(utf8bytes(json.dumps(comment_info, sort_keys=True, indent=4)))
 
     return submission_count + comment_count
+
+
+@shared_task(bind=True)
+def recalculate_user_points(self, profile_id):
+    clear_pending(self, profile_id)
+    profile = Profile.objects.get(id=profile_id)
+    profile._updating_stats_only = True
+    profile.calculate_points()
@@ -24,4 +24,7 @@ def from_database_time(datetime):
     tz = connection.timezone
     if tz is None:
         return datetime
+    # This is called once per row by the contest formats; UTC needs no DST resolution.
+    if tz is timezone.utc:
+        return datetime.replace(tzinfo=tz)
     return make_aware(datetime, tz)
@@ -1,4 +1,5 @@
 from celery.result import AsyncResult
+from django.core.cache import cache
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.utils.http import urlencode
@@ -52,6 +53,20 @@ class Progress:
             self.done = self._total
 
 
+def _pending_key(task, args):
+    return 'celery_pending:%s:%s' % (task.name, ':'.join(map(str, args)))
+
+
+def delay_once(task, *args, timeout=300):
+    # If an identical call is still waiting in the queue, it will pick up our changes as well.
+    if cache.add(_pending_key(task, args), True, timeout):
+        task.delay(*args)
+
+
+def clear_pending(task, *args):
+    cache.delete(_pending_key(task, args))
+
+
 def task_status_url_by_id(result_id, message=None, redirect=None):
     args = {}
     if message:
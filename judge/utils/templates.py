@@ -0,0 +1,9 @@
+from functools import lru_cache
+
+from django.template.loader import get_template
+
+
+@lru_cache(maxsize=None)
+def get_cached_template(template_name):
+    # Resolves each template name through the configured engines only once per process.
+    return get_template(template_name)
@@ -0,0 +1,32 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from judge.utils.celery import clear_pending, delay_once
+
+
+class FakeTask:
+    name = 'judge.tests.fake_task'
+
+    def __init__(self):
+        self.calls = []
+
+    def delay(self, *args):
+        self.calls.append(args)
+
+
+class DelayOnceTestCase(SimpleTestCase):
+    def setUp(self):
+        self.task = FakeTask()
+        cache.clear()
+
+    def test_coalesces_pending_calls(self):
+        delay_once(self.task, 1)
+        delay_once(self.task, 1)
+        delay_once(self.task, 2)
+        self.assertEqual(self.task.calls, [(1,), (2,)])
+
+    def test_requeues_after_start(self):
+        delay_once(self.task, 1)
+        clear_pending(self.task, 1)
+        delay_once(self.task, 1)
+        self.assertEqual(self.task.calls, [(1,), (1,)])
@@ -3,15 +3,17 @@ from calendar import Calendar, SUNDAY
 from collections import defaultdict, namedtuple
 from datetime import date, datetime, time, timedelta
 from functools import partial
-from itertools import chain
 from operator import attrgetter, itemgetter
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from django.db import IntegrityError
-from django.db.models import BooleanField, Case, Count, F, FloatField, IntegerField, Max, Min, Q, Sum, Value, When
+from django.db.models import BooleanField, Case, Count, F, FloatField, IntegerField, Max, Min, Prefetch, Q, Sum, \
+    Value, When
 from django.db.models.expressions import CombinedExpression, Exists, OuterRef
 from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
@@ -30,10 +32,11 @@ from icalendar import Calendar as ICalendar, Event
 from reversion import revisions
 
 from judge import event_poster as event
+from judge.caching import contest_ranking_key
 from judge.comments import CommentedDetailView
 from judge.forms import ContestCloneForm
 from judge.models import Contest, ContestMoss, ContestParticipation, ContestProblem, ContestTag, \
-    Problem, Profile, Submission
+    Organization, Problem, Profile, Submission
 from judge.tasks import run_moss
 from judge.utils.celery import redirect_to_task_status
 from judge.utils.opengraph import generate_opengraph
@@ -50,16 +53,23 @@ __all__ = ['ContestList', 'ContestDetail', 'ContestRanking', 'ContestJoin', 'Con
 
 
 def _find_contest(request, key, private_check=True):
+    # get_visible_contests applies the same rules as Contest.access_check, but in the lookup query itself.
+    queryset = Contest.get_visible_contests(request.user) if private_check else Contest.objects
     try:
-        contest = Contest.objects.get(key=key)
-        if private_check and not contest.is_accessible_by(request.user):
-            raise ObjectDoesNotExist()
+        contest = queryset.get(key=key)
     except ObjectDoesNotExist:
         return generic_message(request, _('No such contest'),
                                _('Could not find a contest with the key "%s".') % key, status=404), False
     return contest, True
 
 
+def _get_participation_contest_id(participation_id):
+    # A participation never moves between contests; the key is cleared on delete, see judge.signals.
+    return cache.get_or_set('cp:%d' % participation_id, lambda: ContestParticipation.objects.filter(
+        id=participation_id,
+    ).values_list('contest_id', flat=True).first(), 3600)
+
+
 class ContestListMixin(object):
     def get_queryset(self):
         return Contest.get_visible_contests(self.request.user)
@@ -106,18 +116,21 @@ class ContestList(QueryStringSortMixin, DiggPaginatorMixin, TitleMixin, ContestL
         return self._get_queryset().order_by(self.order, 'key').filter(end_time__lt=self._now)
 
     def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
-        return super().get_paginator(queryset, per_page, orphans, allow_empty_first_page,
-                                     count=self.get_queryset().values('id').count(), **kwargs)
+        # Count against the bare visibility queryset: the prefetches and EXISTS annotations
+        # on the listing queryset have no effect on the number of rows.
+        count = super().get_queryset().filter(end_time__lt=self._now).values('id').count()
+        return super().get_paginator(queryset, per_page, orphans, allow_empty_first_page, count=count, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super(ContestList, self).get_context_data(**kwargs)
         present, active, future = [], [], []
         finished = set()
-        for contest in self._get_queryset().exclude(end_time__lt=self._now):
-            if contest.start_time > self._now:
-                future.append(contest)
-            else:
-                present.append(contest)
+        # Let the database bucket and order the contests: present ones by end time, then future ones by start time.
+        upcoming = Q(start_time__gt=self._now)
+        for contest in self._get_queryset().exclude(end_time__lt=self._now).annotate(
+            is_future=Case(When(upcoming, then=True), default=False, output_field=BooleanField()),
+        ).order_by('is_future', Case(When(upcoming, then=F('start_time')), default=F('end_time')), 'key'):
+            (future if contest.is_future else present).append(contest)
 
         if self.request.user.is_authenticated:
             for participation in (
@@ -133,8 +146,6 @@ class ContestList(QueryStringSortMixin, DiggPaginatorMixin, TitleMixin, ContestL
                     present.remove(participation.contest)
 
         active.sort(key=attrgetter('end_time', 'key'))
-        present.sort(key=attrgetter('end_time', 'key'))
-        future.sort(key=attrgetter('start_time'))
         context['active_participations'] = active
         context['current_contests'] = present
         context['future_contests'] = future
@@ -203,7 +214,7 @@ class ContestMixin(object):
             context['live_participation'] = None
             context['has_joined'] = False
 
-        context['now'] = timezone.now()
+        context['now'] = self.object._now
         context['is_editor'] = self.is_editor
         context['is_tester'] = self.is_tester
         context['is_spectator'] = self.is_spectator
@@ -225,8 +236,8 @@ class ContestMixin(object):
         contest = super(ContestMixin, self).get_object(queryset)
 
         profile = self.request.profile
-        if (profile is not None and
-                ContestParticipation.objects.filter(id=profile.current_contest_id, contest_id=contest.id).exists()):
+        if (profile is not None and profile.current_contest_id is not None and
+                _get_participation_contest_id(profile.current_contest_id) == contest.id):
             return contest
 
         try:
@@ -270,7 +281,7 @@ class ContestDetail(ContestMixin, TitleMixin, CommentedDetailView):
         context['contest_problems'] = Problem.objects.filter(contests__contest=self.object) \
             .order_by('contests__order').defer('description') \
             .annotate(has_public_editorial=Case(
-                When(solution__is_public=True, solution__publish_on__lte=timezone.now(), then=True),
+                When(solution__is_public=True, solution__publish_on__lte=self.object._now, then=True),
                 default=False,
                 output_field=BooleanField(),
             )) \
@@ -473,7 +484,8 @@ class ContestCalendar(TitleMixin, ContestListMixin, TemplateView):
             self.month = int(kwargs['month'])
         except (KeyError, ValueError):
             raise ImproperlyConfigured('ContestCalendar requires integer year and month')
-        self.today = timezone.now().date()
+        self.now = timezone.now()
+        self.today = self.now.date()
         return self.render()
 
     def render(self):
@@ -482,12 +494,15 @@ class ContestCalendar(TitleMixin, ContestListMixin, TemplateView):
 
     def get_contest_data(self, start, end):
         end += timedelta(days=1)
+        # The calendar only links to each contest by name, so skip building model instances.
         contests = self.get_queryset().filter(Q(start_time__gte=start, start_time__lt=end) |
-                                              Q(end_time__gte=start, end_time__lt=end))
+                                              Q(end_time__gte=start, end_time__lt=end)) \
+            .values('key', 'name', 'start_time', 'end_time')
         starts, ends, oneday = (defaultdict(list) for i in range(3))
+        tz = timezone.get_current_timezone()
         for contest in contests:
-            start_date = timezone.localtime(contest.start_time).date()
-            end_date = timezone.localtime(contest.end_time - timedelta(seconds=1)).date()
+            start_date = contest['start_time'].astimezone(tz).date()
+            end_date = (contest['end_time'] - timedelta(seconds=1)).astimezone(tz).date()
             if start_date == end_date:
                 oneday[start_date].append(contest)
             else:
@@ -499,9 +514,10 @@ class ContestCalendar(TitleMixin, ContestListMixin, TemplateView):
         calendar = Calendar(self.firstweekday).monthdatescalendar(self.year, self.month)
         starts, ends, oneday = self.get_contest_data(make_aware(datetime.combine(calendar[0][0], time.min)),
                                                      make_aware(datetime.combine(calendar[-1][-1], time.min)))
+        # Look up with .get() so that days without contests don't grow the defaultdicts.
         return [[ContestDay(
-            date=date, is_pad=date.month != self.month,
-            is_today=date == self.today, starts=starts[date], ends=ends[date], oneday=oneday[date],
+            date=date, is_pad=date.month != self.month, is_today=date == self.today,
+            starts=starts.get(date, ()), ends=ends.get(date, ()), oneday=oneday.get(date, ()),
         ) for date in week] for week in calendar]
 
     def get_context_data(self, **kwargs):
@@ -527,7 +543,7 @@ class ContestCalendar(TitleMixin, ContestListMixin, TemplateView):
             # 404 is valid because it merely declares the lack of existence, without any reason
             raise Http404()
 
-        context['now'] = timezone.now()
+        context['now'] = self.now
         context['calendar'] = self.get_table()
         context['curr_month'] = date(self.year, self.month, 1)
 
@@ -642,15 +658,25 @@ ContestRankingProfile = namedtuple(
 BestSolutionData = namedtuple('BestSolutionData', 'code points time state is_pretested')
 
 
-def make_contest_ranking_profile(contest, participation, contest_problems):
+def make_contest_ranking_profile(contest, participation, contest_problems, participation_rating):
+    # Resolved once here rather than once per problem cell.
+    format_display_user_problem = contest.format.display_user_problem
+
     def display_user_problem(contest_problem):
         # When the contest format is changed, `format_data` might be invalid.
         # This will cause `display_user_problem` to error, so we display '???' instead.
         try:
-            return contest.format.display_user_problem(participation, contest_problem)
+            return format_display_user_problem(participation, contest_problem)
         except (KeyError, TypeError, ValueError):
             return mark_safe('<td>???</td>')
 
+    if participation.format_data:
+        problem_cells = list(map(display_user_problem, contest_problems))
+    else:
+        # Participations without any results yet (e.g. everyone before the first submission is judged) only need
+        # empty cells, without looking up format_data for every problem.
+        problem_cells = list(map(contest.format.display_empty_user_problem, contest_problems))
+
     user = participation.user
     return ContestRankingProfile(
         id=user.id,
@@ -661,30 +687,83 @@ def make_contest_ranking_profile(contest, participation, contest_problems):
         cumtime=participation.cumtime,
         tiebreaker=participation.tiebreaker,
         organization=user.organization,
-        participation_rating=participation.rating.rating if hasattr(participation, 'rating') else None,
-        problem_cells=[display_user_problem(contest_problem) for contest_problem in contest_problems],
+        participation_rating=participation_rating,
+        problem_cells=problem_cells,
         result_cell=contest.format.display_participation_result(participation),
         participation=participation,
         display_name=user.display_name,
     )
 
 
+def _get_participation_rating(participation):
+    return participation.rating.rating if hasattr(participation, 'rating') else None
+
+
 def base_contest_ranking_list(contest, problems, queryset):
-    return [make_contest_ranking_profile(contest, participation, problems) for participation in
-            queryset.select_related('user__user', 'rating').defer('user__about', 'user__organizations__about')]
+    return [make_contest_ranking_profile(contest, participation, problems, _get_participation_rating(participation))
+            for participation in _ranking_participations(queryset)]
+
+
+def _ranking_participations(queryset):
+    # The ranking table only links to the first organization by its short name.
+    organizations = Prefetch('user__organizations', queryset=Organization.objects.only('id', 'slug', 'short_name'))
+    return queryset.select_related('user__user', 'rating').defer('user__about').prefetch_related(organizations)
+
+
+# The cached ranking holds only these values, in model field order as Model.from_db() expects. The rendered cells
+# depend on the viewer's locale, and pickled model instances of a large contest would not fit in one cache entry.
+RANKING_PARTICIPATION_FIELDS = ('id', 'user_id', 'real_start', 'score', 'cumtime', 'is_disqualified', 'tiebreaker',
+                                'virtual', 'format_data')
+RANKING_PROFILE_FIELDS = ('id', 'user_id', 'display_rank', 'rating', 'username_display_override')
+RANKING_USER_FIELDS = ('id', 'username')
+RANKING_ORGANIZATION_FIELDS = ('id', 'slug', 'short_name')
+
+
+def _get_ranking_row(participation):
+    profile = participation.user
+    organization = profile.organization
+    return (
+        [getattr(participation, field) for field in RANKING_PARTICIPATION_FIELDS],
+        [getattr(profile, field) for field in RANKING_PROFILE_FIELDS],
+        [getattr(profile.user, field) for field in RANKING_USER_FIELDS],
+        organization and [getattr(organization, field) for field in RANKING_ORGANIZATION_FIELDS],
+        _get_participation_rating(participation),
+    )
+
+
+def _load_ranking_row(contest, row):
+    participation_values, profile_values, user_values, organization_values, rating = row
+    db = contest._state.db
+    profile = Profile.from_db(db, RANKING_PROFILE_FIELDS, profile_values)
+    profile.user = User.from_db(db, RANKING_USER_FIELDS, user_values)
+    profile.organization = organization_values and \
+        Organization.from_db(db, RANKING_ORGANIZATION_FIELDS, organization_values)
+    participation = ContestParticipation.from_db(db, RANKING_PARTICIPATION_FIELDS, participation_values)
+    participation.contest = contest
+    participation.user = profile
+    return participation, rating
 
 
 def contest_ranking_list(contest, problems):
-    return base_contest_ranking_list(contest, problems, contest.users.filter(virtual=0)
-                                     .prefetch_related('user__organizations')
-                                     .order_by('is_disqualified', '-score', 'cumtime', 'tiebreaker'))
+    # Invalidated whenever a participation, the contest, a user or an organization is saved, see judge.signals.
+    key = contest_ranking_key(contest.id)
+    rows = cache.get(key)
+    if rows is None:
+        rows = [_get_ranking_row(participation) for participation in _ranking_participations(
+            contest.users.filter(virtual=0).order_by('is_disqualified', '-score', 'cumtime', 'tiebreaker'),
+        )]
+        cache.set(key, rows, settings.DMOJ_CONTEST_RANKING_CACHE_TTL)
+    return [make_contest_ranking_profile(contest, participation, problems, rating)
+            for participation, rating in (_load_ranking_row(contest, row) for row in rows)]
 
 
 def get_contest_ranking_list(request, contest, participation=None, ranking_list=contest_ranking_list,
                              show_current_virtual=True, ranker=ranker):
-    problems = list(contest.contest_problems.select_related('problem').defer('problem__description').order_by('order'))
+    # Only what the ranking table header and the contest formats' problem cells read.
+    problems = list(contest.contest_problems.select_related('problem')
+                    .only('id', 'points', 'is_pretested', 'order', 'problem', 'problem__code').order_by('order'))
 
-    users = ranker(ranking_list(contest, problems), key=attrgetter('points', 'cumtime', 'tiebreaker'))
+    users = list(ranker(ranking_list(contest, problems), key=attrgetter('points', 'cumtime', 'tiebreaker')))
 
     if show_current_virtual:
         if participation is None and request.user.is_authenticated:
@@ -692,7 +771,8 @@ def get_contest_ranking_list(request, contest, participation=None, ranking_list=
             if participation is None or participation.contest_id != contest.id:
                 participation = None
         if participation is not None and participation.virtual:
-            users = chain([('-', make_contest_ranking_profile(contest, participation, problems))], users)
+            users.insert(0, ('-', make_contest_ranking_profile(contest, participation, problems,
+                                                               _get_participation_rating(participation))))
     return users, problems
 
 
@@ -709,7 +789,7 @@ def contest_ranking_ajax(request, contest, participation=None):
         'users': users,
         'problems': problems,
         'contest': contest,
-        'has_rating': contest.ratings.exists(),
+        'has_rating': any(user.participation_rating is not None for rank, user in users),
     })
 
 
@@ -759,7 +839,7 @@ class ContestRanking(ContestRankingBase):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['has_rating'] = self.object.ratings.exists()
+        context['has_rating'] = any(user.participation_rating is not None for rank, user in context['users'])
         return context
 
 
@@ -789,7 +869,6 @@ class ContestParticipationList(LoginRequiredMixin, ContestRankingBase):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['has_rating'] = False
-        context['now'] = timezone.now()
         context['rank_header'] = _('Participation')
         return context
 
@@ -1,19 +1,26 @@
 import traceback
 
-from django.shortcuts import render
+from django.http import HttpResponse
 from django.utils.translation import gettext as _
 
+from judge.utils.templates import get_cached_template
+
+
+# Error pages can come in bursts, so don't go through the template loaders for every one of them.
+def _render(request, template_name, context, status):
+    return HttpResponse(get_cached_template(template_name).render(context, request), status=status)
+
 
 def error(request, context, status):
-    return render(request, 'error.html', context=context, status=status)
+    return _render(request, 'error.html', context, status)
 
 
 def error404(request, exception=None):
     # TODO: "panic: go back"
-    return render(request, 'generic-message.html', {
+    return _render(request, 'generic-message.html', {
         'title': _('404 error'),
         'message': _('Could not find page "%s"') % request.path,
-    }, status=404)
+    }, 404)
 
 
 def error403(request, exception=None):
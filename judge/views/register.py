@@ -5,6 +5,7 @@ from django import forms
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import get_default_password_validators
+from django.core.cache import cache
 from django.forms import ChoiceField, ModelChoiceField
 from django.shortcuts import render
 from django.utils.translation import gettext, gettext_lazy as _, ngettext
@@ -18,18 +19,26 @@ from judge.utils.recaptcha import ReCaptchaField, ReCaptchaWidget
 from judge.utils.subscription import Subscription, newsletter_id
 from judge.widgets import Select2MultipleWidget, Select2Widget
 
+valid_username = re.compile(r'^\w+$')
+bad_mail_providers = frozenset(settings.BAD_MAIL_PROVIDERS)
 bad_mail_regex = list(map(re.compile, settings.BAD_MAIL_PROVIDER_REGEX))
 
 
+def _get_default_language():
+    # The registration form is rendered far more often than languages change; cleared in judge.signals.
+    return cache.get_or_set('lang:default:%s' % settings.DEFAULT_USER_LANGUAGE, Language.get_default_language, 86400)
+
+
 class CustomRegistrationForm(RegistrationForm):
-    username = forms.RegexField(regex=r'^\w+$', max_length=30, label=_('Username'),
+    username = forms.RegexField(regex=valid_username, max_length=30, label=_('Username'),
                                 error_messages={'invalid': _('A username must contain letters, '
                                                              'numbers, or underscores.')})
     timezone = ChoiceField(label=_('Timezone'), choices=TIMEZONE,
                            widget=Select2Widget(attrs={'style': 'width:100%'}))
     language = ModelChoiceField(queryset=Language.objects.all(), label=_('Preferred language'), empty_label=None,
                                 widget=Select2Widget(attrs={'style': 'width:100%'}))
-    organizations = SortedMultipleChoiceField(queryset=Organization.objects.filter(is_open=True),
+    # Only the primary key and the name (for the label) are needed to render and validate the choices.
+    organizations = SortedMultipleChoiceField(queryset=Organization.objects.filter(is_open=True).only('id', 'name'),
                                               label=_('Organizations'), required=False,
                                               widget=Select2MultipleWidget(attrs={'style': 'width:100%'}))
 
@@ -40,15 +49,16 @@ class CustomRegistrationForm(RegistrationForm):
         captcha = ReCaptchaField(widget=ReCaptchaWidget())
 
     def clean_email(self):
-        if User.objects.filter(email=self.cleaned_data['email']).exists():
-            raise forms.ValidationError(gettext('The email address "%s" is already taken. Only one registration '
-                                                'is allowed per address.') % self.cleaned_data['email'])
-        if '@' in self.cleaned_data['email']:
-            domain = self.cleaned_data['email'].split('@')[-1].lower()
-            if (domain in settings.BAD_MAIL_PROVIDERS or
-                    any(regex.match(domain) for regex in bad_mail_regex)):
+        # Reject banned providers before going to the database.
+        mailbox, at, domain = self.cleaned_data['email'].rpartition('@')
+        if at:
+            domain = domain.lower()
+            if domain in bad_mail_providers or any(regex.match(domain) for regex in bad_mail_regex):
                 raise forms.ValidationError(gettext('Your email provider is not allowed due to history of abuse. '
                                                     'Please use a reputable email provider.'))
+        if User.objects.filter(email__iexact=self.cleaned_data['email']).exists():
+            raise forms.ValidationError(gettext('The email address "%s" is already taken. Only one registration '
+                                                'is allowed per address.') % self.cleaned_data['email'])
         return self.cleaned_data['email']
 
     def clean_organizations(self):
@@ -76,24 +86,33 @@ class RegistrationView(OldRegistrationView):
 
     def register(self, form):
         user = super(RegistrationView, self).register(form)
-        profile, _ = Profile.objects.get_or_create(user=user, defaults={
-            'language': Language.get_default_language(),
-        })
-
         cleaned_data = form.cleaned_data
-        profile.timezone = cleaned_data['timezone']
-        profile.language = cleaned_data['language']
-        profile.organizations.add(*cleaned_data['organizations'])
-        profile.save()
+        profile, created = Profile.objects.get_or_create(user=user, defaults={
+            'timezone': cleaned_data['timezone'],
+            'language': cleaned_data['language'],
+        })
+        if created:
+            # A new profile has no organizations, so skip the existing row and sort order lookups done by add().
+            through = Profile.organizations.through
+            through.objects.bulk_create([
+                through(profile_id=profile.id, organization_id=organization.id, sort_value=index)
+                for index, organization in enumerate(cleaned_data['organizations'], 1)
+            ])
+        else:
+            profile.timezone = cleaned_data['timezone']
+            profile.language = cleaned_data['language']
+            profile.save(update_fields=['timezone', 'language'])
+            profile.organizations.add(*cleaned_data['organizations'])
 
         if newsletter_id is not None and cleaned_data['newsletter']:
-            Subscription(user=user, newsletter_id=newsletter_id, subscribed=True).save()
+            # Not bulk_create(): Subscription.save() fills in the subscribe date from the subscribed flag.
+            Subscription.objects.create(user=user, newsletter_id=newsletter_id, subscribed=True)
         return user
 
     def get_initial(self, *args, **kwargs):
         initial = super(RegistrationView, self).get_initial(*args, **kwargs)
         initial['timezone'] = settings.DEFAULT_USER_TIME_ZONE
-        initial['language'] = Language.objects.get(key=settings.DEFAULT_USER_LANGUAGE)
+        initial['language'] = _get_default_language()
         return initial
 
 
@@ -1,8 +1,9 @@
 from django import forms
 from django.core.exceptions import FieldError
-from django.template.loader import get_template
 from django.utils.safestring import mark_safe
 
+from judge.utils.templates import get_cached_template
+
 
 class CheckboxSelectMultipleWithSelectAll(forms.CheckboxSelectMultiple):
     def render(self, name, value, attrs=None, renderer=None):
@@ -12,11 +13,15 @@ class CheckboxSelectMultipleWithSelectAll(forms.CheckboxSelectMultiple):
         select_all_id = attrs['id'] + '_all'
         select_all_name = name + '_all'
         original = super(CheckboxSelectMultipleWithSelectAll, self).render(name, value, attrs, renderer)
-        template = get_template('widgets/select_all.html')
+        template = get_cached_template('widgets/select_all.html')
+        # Choices may be backed by a queryset, so only iterate them once. Compare as strings, like format_value()
+        # does for the checkboxes themselves: model choice values are not hashable.
+        choices = list(self.choices)
+        selected = set(map(str, value)) if value else ()
         return mark_safe(template.render({
             'original_widget': original,
             'select_all_id': select_all_id,
             'select_all_name': select_all_name,
-            'all_selected': all(choice[0] in value for choice in self.choices) if value else False,
-            'empty': not self.choices,
+            'all_selected': bool(selected) and all(str(choice[0]) in selected for choice in choices),
+            'empty': not choices,
         }))
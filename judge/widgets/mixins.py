@@ -1,9 +1,13 @@
+import re
 from textwrap import dedent
 
 from django import forms
 from django.conf import settings
 from django.template import Context, Template
-from lxml import html
+
+# django-compressor outputs a single <link> or <script> tag per compressed block.
+compressed_css_url = re.compile(r'<link\b[^>]*\shref="([^"]+)"')
+compressed_js_url = re.compile(r'<script\b[^>]*\ssrc="([^"]+)"')
 
 
 class CompressorWidgetMixin(object):
@@ -19,13 +23,6 @@ class CompressorWidgetMixin(object):
         {% endcompress %}
     """)
 
-    __templates = {
-        (False, False): Template(''),
-        (True, False): Template('{% load compress %}' + __template_css),
-        (False, True): Template('{% load compress %}' + __template_js),
-        (True, True): Template('{% load compress %}' + __template_js + __template_css),
-    }
-
     compress_css = False
     compress_js = False
 
@@ -35,13 +32,35 @@ class CompressorWidgetMixin(object):
         pass
     else:
         if getattr(settings, 'COMPRESS_ENABLED', not settings.DEBUG):
+            # Only compile the templates when they can be used: {% load compress %} needs compressor.
+            __templates = {
+                (True, False): Template('{% load compress %}' + __template_css),
+                (False, True): Template('{% load compress %}' + __template_js),
+                (True, True): Template('{% load compress %}' + __template_js + __template_css),
+            }
+
+            # The compressed media only depends on the source media and the flags, and is the same for the
+            # lifetime of the process, so compress each combination once rather than on every access.
+            __media_cache = {}
+
             @property
             def media(self):
                 media = super().media
+                if not (self.compress_css or self.compress_js):
+                    return media
+
+                key = (self.compress_css, self.compress_js, tuple(media._js),
+                       tuple((medium, tuple(paths)) for medium, paths in media._css.items()))
+                try:
+                    return self.__media_cache[key]
+                except KeyError:
+                    pass
+
                 template = self.__templates[self.compress_css, self.compress_js]
-                result = html.fromstring(template.render(Context({'media': media})))
+                result = template.render(Context({'media': media}))
 
-                return forms.Media(
-                    css={'all': [result.find('.//link').get('href')]} if self.compress_css else media._css,
-                    js=[result.find('.//script').get('src')] if self.compress_js else media._js,
+                compressed = self.__media_cache[key] = forms.Media(
+                    css={'all': [compressed_css_url.search(result).group(1)]} if self.compress_css else media._css,
+                    js=[compressed_js_url.search(result).group(1)] if self.compress_js else media._js,
                 )
+                return compressed
@@ -1,8 +1,7 @@
 from django.forms.utils import flatatt
-from django.template.loader import get_template
-from django.utils.encoding import force_str
 from django.utils.html import conditional_escape
 
+from judge.utils.templates import get_cached_template
 from judge.widgets.mixins import CompressorWidgetMixin
 
 __all__ = ['PagedownWidget', 'MathJaxPagedownWidget', 'HeavyPreviewPageDownWidget']
@@ -50,12 +49,12 @@ else:
             if 'class' not in final_attrs:
                 final_attrs['class'] = ''
             final_attrs['class'] += ' wmd-input'
-            return get_template(self.template).render(self.get_template_context(final_attrs, value))
+            return get_cached_template(self.template).render(self.get_template_context(final_attrs, value))
 
         def get_template_context(self, attrs, value):
             return {
                 'attrs': flatatt(attrs),
-                'body': conditional_escape(force_str(value)),
+                'body': conditional_escape(value),
                 'id': attrs['id'],
                 'show_preview': self.show_preview,
                 'preview_url': self.preview_url,
@@ -84,27 +84,19 @@ class Select2Mixin(object):
             self.choices = list(chain([('', '')], self.choices))
         return super(Select2Mixin, self).optgroups(name, value, attrs=attrs)
 
-    @property
-    def media(self):
-        """
-        Construct Media as a dynamic property.
-
-        .. Note:: For more information visit
-            https://docs.djangoproject.com/en/1.8/topics/forms/media/#media-as-a-dynamic-property
-        """
-        return forms.Media(
-            js=[settings.SELECT2_JS_URL, 'django_select2.js'],
-            css={'screen': [settings.SELECT2_CSS_URL]},
-        )
+    # The media only depends on settings, so build it once rather than on every access.
+    # Media objects are never modified in place; combining them creates a new one.
+    media = forms.Media(
+        js=[settings.SELECT2_JS_URL, 'django_select2.js'],
+        css={'screen': [settings.SELECT2_CSS_URL]},
+    )
 
 
 class AdminSelect2Mixin(Select2Mixin):
-    @property
-    def media(self):
-        return forms.Media(
-            js=['admin/js/jquery.init.js', settings.SELECT2_JS_URL, 'django_select2.js'],
-            css={'screen': [settings.SELECT2_CSS_URL, 'select2-dmoj.css']},
-        )
+    media = forms.Media(
+        js=['admin/js/jquery.init.js', settings.SELECT2_JS_URL, 'django_select2.js'],
+        css={'screen': [settings.SELECT2_CSS_URL, 'select2-dmoj.css']},
+    )
 
 
 class Select2TagMixin(object):